@@ -1,5 +1,18 @@
+import argparse
+import asyncio
+import functools
 import logging
-from typing import Dict
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
 
 from telegram import (
     InlineKeyboardButton,
@@ -8,31 +21,84 @@ from telegram import (
     ReplyKeyboardRemove,
 )
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
+from telegram.request import HTTPXRequest
 
 # Firebase
 import firebase_admin
 from firebase_admin import credentials, db
 
+from rtdb_mirror import apply_delta
+
 # ------------------ Configuration (edit these) ------------------
 TOKEN = "Telegram bot token id"
 SERVICE_ACCOUNT_PATH = r"Service Account Path"  # change to your key path
 DATABASE_URL = "Database URL"  # change to your DB URL
+# Webhook mode (--webhook): public HTTPS URL of the reverse proxy in front of the bot
+PUBLIC_URL = os.environ.get("PUBLIC_URL", "")
 # ----------------------------------------------------------------
 
+# OAuth2 scopes needed to read the Realtime Database over REST
+FIREBASE_SCOPES = [
+    "https://www.googleapis.com/auth/firebase.database",
+    "https://www.googleapis.com/auth/userinfo.email",
+]
+
+# Student lookup cache: PRN -> (fetched_at, record or None for unknown PRN)
+STUDENT_CACHE: "OrderedDict[str, Tuple[float, Optional[Dict]]]" = OrderedDict()
+STUDENT_CACHE_TTL = 300
+STUDENT_CACHE_MISS_TTL = 30  # unknown PRNs expire sooner
+STUDENT_CACHE_MAX = 10_000
+
+# Keep the whole Students node in memory when it is at most this many records;
+# bigger datasets fall back to per-PRN lookups through STUDENT_CACHE
+STUDENTS_PREFETCH_MAX = 50_000
+
+# Application writes are queued and flushed in batches by a background task
+WRITE_QUEUE_MAX = 1000
+WRITE_BATCH_WINDOW = 0.1  # seconds to wait for more submissions before flushing
+WRITE_CONFIRM_TIMEOUT = 15  # seconds a submission waits for the writer before giving up
+
+# Blocking firebase_admin / google-auth calls run here, never on the event loop
+EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fb")
+CONCURRENT_UPDATES = 64  # updates PTB processes at once (its default is 1: strictly serial)
+
+# Debug-only dump of Students keys on PRN misses (O(N) download, keep off in prod)
+DEBUG_DUMP_KEYS = bool(os.getenv("DEBUG_DUMP_KEYS"))
+STUDENT_KEYS_TTL = 60
+_student_keys_cache: Dict = {"fetched_at": 0.0, "keys": None}
+
+# PRN: exactly 8 ASCII digits (adjust to match DB)
+PRN_RE = re.compile(r"\A[0-9]{8}\Z", re.ASCII)
+# Maps non-ASCII decimal digits users may type (fullwidth, Arabic-Indic, Devanagari, ...) to ASCII
+_DIGIT_ZEROS = (0xFF10, 0x0660, 0x06F0, 0x0966, 0x09E6, 0x0A66, 0x0AE6, 0x0B66, 0x0BE6, 0x0C66, 0x0CE6, 0x0D66)
+DIGIT_TRANS = str.maketrans({chr(zero + i): str(i) for zero in _DIGIT_ZEROS for i in range(10)})
+
+# user_data entries (and open conversations) idle for longer than this are dropped
+USER_DATA_MAX_AGE = 6 * 3600
+USER_DATA_SWEEP_INTERVAL = 3600
+
 # Conversation states
-GET_PRN, GET_NAME, GET_PHONE, CONFIRM = range(4)
+GET_PRN, GET_NAME, GET_PHONE, CONFIRM, GET_ALL = range(5)
+
+# Collect PRN, name and phone in one "PRN|NAME|PHONE" message (GET_ALL).
+# Set BONAFIDE_SINGLE_FORM=0 to go back to asking for them one by one.
+SINGLE_FORM_BONAFIDE = os.getenv("BONAFIDE_SINGLE_FORM", "1") != "0"
 
-# Initialize logging
+# Initialize logging (LOG_LEVEL=WARNING is a good choice for production).
+# No %(asctime)s: it costs a strftime per record, and journald/docker timestamp lines anyway.
 logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    format="%(levelname)s %(name)s %(message)s",
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
 )
 logger = logging.getLogger(__name__)
 
@@ -63,23 +129,265 @@ def setup_db_refs():
     applications_ref = db.reference("bonafide_applications")
 
 
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on EXECUTOR so other conversations keep being served."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+# ------------------ Async RTDB REST client ------------------
+# firebase_admin reads are blocking HTTPS calls; inside async handlers they
+# stall every conversation. Reads go through a shared aiohttp session instead.
+
+async def post_init(application: Application) -> None:
+    """Create the shared HTTP session and service-account credentials."""
+    application.bot_data["creds"] = service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_PATH, scopes=FIREBASE_SCOPES
+    )
+    application.bot_data["creds_lock"] = asyncio.Lock()
+    application.bot_data["http"] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=75)
+    )
+    await prefetch_students(application)
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_MAX)
+    application.bot_data["write_q"] = write_q
+    application.bot_data["writer"] = asyncio.create_task(application_writer(write_q))
+
+
+async def post_shutdown(application: Application) -> None:
+    writer = application.bot_data.get("writer")
+    if writer:
+        # sentinel: flush whatever is still queued, then stop
+        await application.bot_data["write_q"].put(None)
+        await writer
+    listener = application.bot_data.get("students_listener")
+    if listener:
+        await run_blocking(listener.close)
+    session = application.bot_data.get("http")
+    if session:
+        await session.close()
+    EXECUTOR.shutdown(wait=False)
+
+
+async def get_access_token(bot_data: Dict) -> str:
+    """Return a cached OAuth2 token, refreshing it only when near expiry."""
+    creds = bot_data["creds"]
+    if not creds.valid:
+        async with bot_data["creds_lock"]:
+            # another coroutine may have refreshed while we waited
+            if not creds.valid:
+                await run_blocking(creds.refresh, Request())
+    return creds.token
+
+
+async def rest_get(bot_data: Dict, path: str, params: Optional[Dict] = None):
+    """GET a JSON node from the RTDB REST API, e.g. rest_get(bot_data, "/Students/123.json")."""
+    token = await get_access_token(bot_data)
+    url = f"{DATABASE_URL.rstrip('/')}/{path.lstrip('/')}"
+    headers = {"Authorization": f"Bearer {token}"}
+    async with bot_data["http"].get(url, params=params, headers=headers) as resp:
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def prn_exists(bot_data: Dict, prn: str) -> bool:
+    """Cheap existence probe: a shallow read returns only the child keys."""
+    return bool(await rest_get(bot_data, f"/Students/{prn}.json", params={"shallow": "true"}))
+
+
+async def fetch_student(bot_data: Dict, prn: str) -> Optional[Dict]:
+    """Look up a student by PRN, serving repeated lookups from STUDENT_CACHE."""
+    now = time.monotonic()
+    cached = STUDENT_CACHE.get(prn)
+    if cached is not None:
+        fetched_at, data = cached
+        ttl = STUDENT_CACHE_TTL if data else STUDENT_CACHE_MISS_TTL
+        if now - fetched_at < ttl:
+            STUDENT_CACHE.move_to_end(prn)
+            return data
+
+    # Most misses are typos, so probe first and only download real records
+    data = None
+    if await prn_exists(bot_data, prn):
+        data = await rest_get(bot_data, f"/Students/{prn}.json")
+    STUDENT_CACHE[prn] = (now, data or None)
+    STUDENT_CACHE.move_to_end(prn)
+    while len(STUDENT_CACHE) > STUDENT_CACHE_MAX:
+        STUDENT_CACHE.popitem(last=False)
+    return data
+
+
+async def lookup_student(bot_data: Dict, prn: str) -> Optional[Dict]:
+    """Resolve a PRN from the in-memory Students index, or fetch it if there is none."""
+    students = bot_data.get("students")
+    if students is not None:
+        return students.get(prn)
+    return await fetch_student(bot_data, prn)
+
+
+# ------------------ In-memory Students index ------------------
+
+async def prefetch_students(application: Application) -> None:
+    """Index Students in memory, seeded and kept fresh by a single RTDB listener."""
+    bot_data = application.bot_data
+    try:
+        # size check first: a shallow read returns only the keys
+        keys = await rest_get(bot_data, "/Students.json", params={"shallow": "true"}) or {}
+    except Exception as e:
+        logger.exception("Could not size Students, using per-PRN lookups: %s", e)
+        return
+    if len(keys) > STUDENTS_PREFETCH_MAX:
+        logger.warning("Students has %d records, too many to index in memory.", len(keys))
+        return
+
+    students: Dict = {}
+
+    def on_event(event) -> None:
+        # runs on firebase_admin's background thread; the first event is the
+        # full snapshot, so the node is downloaded once, not get() + listen()
+        if apply_delta(students, event) and "students" not in bot_data:
+            bot_data["students"] = students  # lookups switch from fetch_student here
+            logger.info("Indexed %d students in memory.", len(students))
+
+    try:
+        # listen() connects synchronously
+        bot_data["students_listener"] = await run_blocking(student_ref.listen, on_event)
+    except Exception as e:
+        logger.exception("Could not listen to Students, using per-PRN lookups: %s", e)
+
+
+# ------------------ Batched application writes ------------------
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+def new_push_key() -> str:
+    """Generate a chronologically ordered Firebase-style push key locally.
+
+    Reference.push() does a network round-trip per key, which would defeat batching.
+    """
+    now = int(time.time() * 1000)
+    stamp = []
+    for _ in range(8):
+        stamp.append(PUSH_CHARS[now % 64])
+        now //= 64
+    return "".join(reversed(stamp)) + "".join(random.choice(PUSH_CHARS) for _ in range(12))
+
+
+async def application_writer(write_q: asyncio.Queue) -> None:
+    """Drain queued (application_data, future) pairs and write each batch with one
+    multi-path update, resolving every future with the outcome."""
+    stopping = False
+    while not stopping:
+        batch = [await write_q.get()]
+        await asyncio.sleep(WRITE_BATCH_WINDOW)
+        while not write_q.empty():
+            batch.append(write_q.get_nowait())
+        if None in batch:
+            stopping = True
+            batch = [item for item in batch if item is not None]
+        if not batch:
+            continue
+
+        updates = {f"bonafide_applications/{new_push_key()}": data for data, _ in batch}
+        try:
+            await run_blocking(db.reference("/").update, updates)
+        except Exception as e:
+            logger.exception("Failed to write %d application(s): %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+
+def slim_student(student_data: Dict) -> Dict:
+    """The few fields the conversation needs, with name/phone pre-normalized.
+
+    Kept in user_data instead of the full record, so per-user memory stays
+    constant however large student records grow.
+    """
+    return {
+        "name_norm": str(student_data.get("name", "")).strip().upper(),
+        "phone_norm": str(student_data.get("phone", "")).strip(),
+        "batch": student_data.get("batch"),
+    }
+
+
+async def student_keys_for_debug(bot_data: Dict):
+    """Top-level Students keys, memoized for STUDENT_KEYS_TTL seconds."""
+    now = time.monotonic()
+    if _student_keys_cache["keys"] is None or now - _student_keys_cache["fetched_at"] >= STUDENT_KEYS_TTL:
+        keys = await rest_get(bot_data, "/Students.json", params={"shallow": "true"})
+        _student_keys_cache.update(fetched_at=now, keys=list(keys or {}))
+    return _student_keys_cache["keys"]
+
+
+# ------------------ Keyboards (static, built once) ------------------
+
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("First Year", callback_data="first_year")],
+    [InlineKeyboardButton("Second Year", callback_data="second_year")],
+    [InlineKeyboardButton("Third Year", callback_data="third_year")],
+    [InlineKeyboardButton("New Admission", callback_data="new_admission")],
+    [InlineKeyboardButton("Admin Office", callback_data="admin_office")],
+])
+
+FIRST_YEAR_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Academic", callback_data="academic")],
+    [InlineKeyboardButton("Back", callback_data="main_menu")],
+])
+
+# Admin office menu includes Bonafide button which will start a ConversationHandler
+ADMIN_OFFICE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Fee Receipt", callback_data="fee_receipt")],
+    [InlineKeyboardButton("Bonafide", callback_data="start_bonafide_flow")],
+    [InlineKeyboardButton("Admission Details", callback_data="admission_details")],
+    [InlineKeyboardButton("Back", callback_data="first_year")],
+])
+
+CONFIRM_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, Submit", callback_data="confirm_yes")],
+    [InlineKeyboardButton("No, Cancel", callback_data="confirm_no")],
+])
+
+NEW_ADMISSION_TEXT = (
+    "This is admission details. Steps and documents required:\n"
+    "1. Step one...\n2. Step two...\n\nIf you need more help, contact the admin office."
+)
+
+# callback_data -> (text, markup) for the simple demo menus
+MENU_TABLE: Dict[str, Tuple[str, Optional[InlineKeyboardMarkup]]] = {
+    "first_year": ("Shows the menu for first-year students.", FIRST_YEAR_MARKUP),
+    "new_admission": (NEW_ADMISSION_TEXT, None),
+    "admin_office": ("Shows the menu for admin office tasks.", ADMIN_OFFICE_MARKUP),
+    # Go back to the top menu
+    "main_menu": ("Use /start to open main menu again.", None),
+}
+
+# ------------------ Handler filters and callback patterns ------------------
+
+TEXT_NOT_COMMAND = filters.TEXT & ~filters.COMMAND
+
+CB_MENU = re.compile(
+    r"^(first_year|second_year|third_year|new_admission|admin_office|main_menu|fee_receipt|admission_details|academic)$"
+)
+CB_START_BONAFIDE = re.compile(r"^start_bonafide_flow$")
+CB_CONFIRM = re.compile(r"^confirm_(yes|no)$")
+CB_CANCEL = re.compile(r"^cancel$")
+
+
 # ------------------ Bot handlers ------------------
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends the main inline menu when /start is called."""
-    keyboard = [
-        [InlineKeyboardButton("First Year", callback_data="first_year")],
-        [InlineKeyboardButton("Second Year", callback_data="second_year")],
-        [InlineKeyboardButton("Third Year", callback_data="third_year")],
-        [InlineKeyboardButton("New Admission", callback_data="new_admission")],
-        [InlineKeyboardButton("Admin Office", callback_data="admin_office")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     if update.message:
-        await update.message.reply_text("Select your year:", reply_markup=reply_markup)
+        await update.message.reply_text("Select your year:", reply_markup=MAIN_MENU_MARKUP)
     else:
         # In case start called in non-standard way
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Select your year:", reply_markup=reply_markup)
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="Select your year:", reply_markup=MAIN_MENU_MARKUP)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -95,45 +403,16 @@ async def button_click_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     if not query:
         return
 
-    await query.answer()  # acknowledge the callback
+    # acknowledge the callback without waiting for Telegram's reply
+    context.application.create_task(query.answer(), update=update)
 
     data = query.data
 
     # Simple routing for demo menus
-    if data == "first_year":
-        keyboard = [
-            [InlineKeyboardButton("Academic", callback_data="academic")],
-            [InlineKeyboardButton("Back", callback_data="main_menu")],
-        ]
-        await query.edit_message_text(
-            text="Shows the menu for first-year students.",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-        )
-
-    elif data == "new_admission":
-        info_text = (
-            "This is admission details. Steps and documents required:\n"
-            "1. Step one...\n2. Step two...\n\nIf you need more help, contact the admin office."
-        )
-        await query.edit_message_text(text=info_text)
-
-    elif data == "admin_office":
-        # Admin office menu includes Bonafide button which will start a ConversationHandler
-        keyboard = [
-            [InlineKeyboardButton("Fee Receipt", callback_data="fee_receipt")],
-            [InlineKeyboardButton("Bonafide", callback_data="start_bonafide_flow")],
-            [InlineKeyboardButton("Admission Details", callback_data="admission_details")],
-            [InlineKeyboardButton("Back", callback_data="first_year")],
-        ]
-        await query.edit_message_text(
-            text="Shows the menu for admin office tasks.",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-        )
-
-    elif data == "main_menu":
-        # Go back to the top menu
-        await query.edit_message_text(text="Use /start to open main menu again.")
-
+    entry = MENU_TABLE.get(data)
+    if entry:
+        text, markup = entry
+        await query.edit_message_text(text=text, reply_markup=markup)
     else:
         # Default response if not implemented
         await query.edit_message_text(text=f"You selected: {data} (This menu is not yet built)")
@@ -149,9 +428,16 @@ async def start_bonafide_flow(update: Update, context: ContextTypes.DEFAULT_TYPE
     # update here is a CallbackQuery update (EntryPoint of ConversationHandler)
     query = update.callback_query
     if query:
-        await query.answer()
+        context.application.create_task(query.answer(), update=update)
         # Save chat id if needed later
         context.user_data["chat_id"] = query.message.chat_id
+        if SINGLE_FORM_BONAFIDE:
+            await query.edit_message_text(
+                text="Please send your details in one message as:\n"
+                "PRN|SURNAME FIRST FATHER'S NAME|PHONE\n\n"
+                "Example: 12345678|DESHMUKH AARAV VIKAS|9876543210"
+            )
+            return GET_ALL
         await query.edit_message_text(text="Please enter your 8-digit PRN Number:")
         return GET_PRN
 
@@ -161,38 +447,35 @@ async def start_bonafide_flow(update: Update, context: ContextTypes.DEFAULT_TYPE
     return ConversationHandler.END
 
 
+def normalize_prn(prn: str) -> Optional[str]:
+    """Return the PRN as 8 ASCII digits, or None if it is not a valid PRN.
+
+    Inputs like '１２３４５６７８' are normalized to '12345678' only when the
+    ASCII fast path does not match.
+    """
+    if PRN_RE.match(prn):
+        return prn
+    converted = prn.translate(DIGIT_TRANS)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Converted PRN to ASCII digits: %r", converted)
+    return converted if PRN_RE.match(converted) else None
+
+
 async def get_prn(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle PRN input, validate against Firebase Students reference (8 digits)."""
     # Raw text the user sent
     raw = update.message.text
     prn = raw.strip()  # remove leading/trailing whitespace
 
-    # Debug logging (will appear in your terminal)
-    logger.info("Received raw PRN input (repr): %r", raw)
-    logger.info("Normalized PRN: %r (len=%d, isdigit=%s)", prn, len(prn), prn.isdigit())
+    # Debug logging (run with LOG_LEVEL=DEBUG to see it in your terminal)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Received raw PRN input (repr): %r", raw)
+        logger.debug("Normalized PRN: %r (len=%d, isdigit=%s)", prn, len(prn), prn.isdigit())
 
-    # Extra safety: convert fullwidth/unicode digits to ascii digits if any (optional)
-    # This ensures inputs like '１２３４５６７８' get normalized to '12345678'
-    try:
-        prn_ascii = "".join(ch for ch in prn if ch.isascii())
-        if prn_ascii != prn:
-            # fallback: try to translate numeric unicode digits to ascii using unicodedata
-            import unicodedata
-            converted = []
-            for ch in prn:
-                try:
-                    d = unicodedata.digit(ch)
-                    converted.append(str(d))
-                except (TypeError, ValueError):
-                    converted.append(ch)
-            prn = "".join(converted)
-            logger.info("Converted PRN to ASCII digits: %r", prn)
-    except Exception:
-        # if anything in conversion fails, we continue with original prn
-        pass
-
-    # VALIDATION: PRN must be digits and 8 characters (adjust to match DB)
-    if not prn.isdigit() or len(prn) != 8:
+    # VALIDATION: PRN must be 8 digits (adjust to match DB)
+    prn = normalize_prn(prn)
+    if prn is None:
         await update.message.reply_text(
             "Invalid PRN. Please enter your 8-digit PRN number (digits only) or type /cancel."
         )
@@ -200,21 +483,22 @@ async def get_prn(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     # Query Firebase DB
     try:
-        student_data = student_ref.child(prn).get()
-        logger.info("Firebase lookup for PRN %s returned: %r", prn, student_data)
+        student_data = await lookup_student(context.application.bot_data, prn)
+        if debug:
+            logger.debug("Firebase lookup for PRN %s returned: %r", prn, student_data)
     except Exception as e:
         logger.exception("Firebase read error: %s", e)
         await update.message.reply_text("Database error. Please try again later.")
         return ConversationHandler.END
 
     if not student_data:
-        # Helpful message with instructions and copy of current DB keys for debug (DO NOT expose to users in production)
-        # We'll log the current top-level keys so you can compare — comment out if you don't want logs
-        try:
-            top_keys = list(student_ref.get(shallow=True).keys()) if student_ref.get(shallow=True) else []
-        except Exception:
-            top_keys = None
-        logger.info("Top-level keys under Students (for debug): %r", top_keys)
+        # Dumping every Students key costs a full key download, so only do it when asked to
+        if DEBUG_DUMP_KEYS and debug:
+            try:
+                top_keys = await student_keys_for_debug(context.application.bot_data)
+            except Exception:
+                top_keys = None
+            logger.debug("Top-level keys under Students (for debug): %r", top_keys)
 
         await update.message.reply_text(
             "Invalid PRN. That PRN is not found in our database. Please try again or type /cancel to exit."
@@ -223,7 +507,7 @@ async def get_prn(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     # Save retrieved student data and PRN
     context.user_data["prn"] = prn
-    context.user_data["student_data"] = student_data
+    context.user_data["student"] = slim_student(student_data)
 
     name_prompt = (
         f"PRN Verified for: {student_data.get('name', '<name not available>')}\n\n"
@@ -237,7 +521,7 @@ async def get_prn(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Validate name against stored student record and move to phone."""
     name_input = update.message.text.strip().upper()
-    correct_name = str(context.user_data["student_data"].get("name", "")).strip().upper()
+    correct_name = context.user_data["student"]["name_norm"]
 
     if name_input != correct_name:
         await update.message.reply_text(
@@ -254,7 +538,7 @@ async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Validate phone and ask for final confirmation."""
     phone_input = update.message.text.strip()
-    correct_phone = str(context.user_data["student_data"].get("phone", "")).strip()
+    correct_phone = context.user_data["student"]["phone_norm"]
 
     if phone_input != correct_phone:
         await update.message.reply_text(
@@ -265,14 +549,59 @@ async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # All details valid. Save phone
     context.user_data["phone"] = phone_input
 
-    # Build inline confirm keyboard
-    keyboard = [
-        [InlineKeyboardButton("Yes, Submit", callback_data="confirm_yes")],
-        [InlineKeyboardButton("No, Cancel", callback_data="confirm_no")],
-    ]
     await update.message.reply_text(
         "All details verified.\nAre you sure you want to submit the application for a bonafide certificate?",
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=CONFIRM_MARKUP,
+    )
+    return CONFIRM
+
+
+async def get_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Validate a single 'PRN|NAME|PHONE' message with one lookup, then confirm."""
+    parts = [part.strip() for part in update.message.text.split("|")]
+    if len(parts) != 3:
+        await update.message.reply_text(
+            "Please send PRN, full name and phone separated by '|', e.g.\n"
+            "12345678|DESHMUKH AARAV VIKAS|9876543210\nor type /cancel."
+        )
+        return GET_ALL
+    raw_prn, name_input, phone_input = parts
+
+    prn = normalize_prn(raw_prn)
+    if prn is None:
+        await update.message.reply_text(
+            "Invalid PRN. The PRN must be 8 digits. Please try again or type /cancel."
+        )
+        return GET_ALL
+
+    try:
+        student_data = await lookup_student(context.application.bot_data, prn)
+    except Exception as e:
+        logger.exception("Firebase read error: %s", e)
+        await update.message.reply_text("Database error. Please try again later.")
+        return ConversationHandler.END
+
+    if not student_data:
+        await update.message.reply_text(
+            "Invalid PRN. That PRN is not found in our database. Please try again or type /cancel to exit."
+        )
+        return GET_ALL
+
+    student = slim_student(student_data)
+    if name_input.upper() != student["name_norm"] or phone_input != student["phone_norm"]:
+        await update.message.reply_text(
+            "Invalid input. Name or phone number does not match our records. Please try again or type /cancel."
+        )
+        return GET_ALL
+
+    context.user_data["prn"] = prn
+    context.user_data["student"] = student
+    context.user_data["name"] = name_input
+    context.user_data["phone"] = phone_input
+
+    await update.message.reply_text(
+        "All details verified.\nAre you sure you want to submit the application for a bonafide certificate?",
+        reply_markup=CONFIRM_MARKUP,
     )
     return CONFIRM
 
@@ -283,23 +612,48 @@ async def confirm_submission(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not query:
         return ConversationHandler.END
 
-    await query.answer()
+    context.application.create_task(query.answer(), update=update)
 
     # yes -> store to Firebase
     if query.data == "confirm_yes":
         try:
-            student_data: Dict = context.user_data.get("student_data", {})
+            student: Dict = context.user_data.get("student", {})
             application_data = {
                 "prn": context.user_data.get("prn"),
                 "name": context.user_data.get("name"),
+                # upper-cased copy, indexed for the admin panel's name search
+                "name_upper": (context.user_data.get("name") or "").upper(),
                 "phone": context.user_data.get("phone"),
-                "batch": student_data.get("batch"),
+                "batch": student.get("batch"),
                 "status": "Pending",
                 "submitted_at": str(query.message.date),
             }
-            # push to database (generates unique id)
-            applications_ref.push().set(application_data)
-            await query.edit_message_text("Application submitted successfully. You will be notified when it is processed.")
+            # queued for the background writer (which generates the unique id);
+            # the DB write and the Telegram edit then run concurrently
+            written = asyncio.get_running_loop().create_future()
+            context.application.bot_data["write_q"].put_nowait((application_data, written))
+            write_result, edit_result = await asyncio.gather(
+                # shielded so a late write still resolves the future instead of hitting a cancelled one
+                asyncio.wait_for(asyncio.shield(written), WRITE_CONFIRM_TIMEOUT),
+                query.edit_message_text("Application submitted successfully. You will be notified when it is processed."),
+                return_exceptions=True,
+            )
+            if isinstance(edit_result, Exception):
+                logger.warning("Could not edit confirmation message: %s", edit_result)
+            if isinstance(write_result, asyncio.TimeoutError):
+                logger.error("Application writer did not answer within %ss.", WRITE_CONFIRM_TIMEOUT)
+                await context.bot.send_message(
+                    chat_id=query.message.chat_id,
+                    text="We could not confirm that your application was saved. Please check with the office before submitting again.",
+                )
+            elif isinstance(write_result, Exception):
+                await context.bot.send_message(
+                    chat_id=query.message.chat_id,
+                    text="Sorry, your application could not be saved. Please try again later.",
+                )
+        except asyncio.QueueFull:
+            logger.warning("Application write queue is full, rejecting submission.")
+            await query.edit_message_text("The server is busy. Please try again in a few minutes.")
         except Exception as e:
             logger.exception("Error submitting application: %s", e)
             await query.edit_message_text("An error occurred. Please try again later.")
@@ -319,56 +673,129 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Operation cancelled.", reply_markup=ReplyKeyboardRemove())
     # If this was a callback query trying to cancel, acknowledge it
     if update.callback_query:
-        await update.callback_query.answer()
+        context.application.create_task(update.callback_query.answer(), update=update)
         await update.callback_query.edit_message_text("Operation cancelled.")
     return ConversationHandler.END
 
 
+# ------------------ user_data housekeeping ------------------
+
+async def touch_user_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Record when each user was last active so idle user_data can be swept."""
+    if update.effective_user:
+        context.user_data["last_seen"] = time.monotonic()
+
+
+async def sweep_user_data(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job: drop user_data of users idle for more than USER_DATA_MAX_AGE."""
+    cutoff = time.monotonic() - USER_DATA_MAX_AGE
+    application = context.application
+    stale = [uid for uid, data in application.user_data.items() if data.get("last_seen", 0) < cutoff]
+    for user_id in stale:
+        application.drop_user_data(user_id)
+    if stale:
+        logger.info("Dropped user_data for %d idle users.", len(stale))
+
+
 # ------------------ Main ------------------
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="PCCOER helpdesk Telegram bot")
+    parser.add_argument(
+        "--webhook",
+        action="store_true",
+        help="receive updates via webhook (needs PUBLIC_URL, PORT and TG_SECRET env vars) instead of polling",
+    )
+    args = parser.parse_args()
+    if args.webhook:
+        # fail here rather than have Telegram reject a relative webhook URL later
+        missing = [name for name in ("PUBLIC_URL", "PORT", "TG_SECRET") if not os.environ.get(name)]
+        if missing:
+            parser.error(f"--webhook needs these environment variables: {', '.join(missing)}")
+
     # initialize firebase
     init_firebase()
     setup_db_refs()
 
-    application = Application.builder().token(TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        # without this PTB runs handlers one at a time for all users, and no
+        # amount of executor/aiohttp concurrency lets two conversations overlap
+        .concurrent_updates(CONCURRENT_UPDATES)
+        # one pooled HTTP/2 connection multiplexes concurrent Bot API calls
+        .request(HTTPXRequest(connection_pool_size=256, http_version="2", pool_timeout=5.0))
+        # throttle locally at Telegram's limits; on a 429 wait retry_after and retry
+        .rate_limiter(
+            AIORateLimiter(
+                overall_max_rate=30,
+                overall_time_period=1,
+                group_max_rate=20,
+                group_time_period=60,
+                max_retries=2,
+            )
+        )
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    if application.job_queue is None:
+        # conversation_timeout and the user_data sweep both run on the JobQueue
+        logger.error("JobQueue unavailable; install python-telegram-bot[job-queue] (see requirements.txt)")
+        raise RuntimeError("python-telegram-bot[job-queue] is required")
 
     # ConversationHandler for bonafide flow
     conv_handler = ConversationHandler(
         entry_points=[
             # When button with callback_data 'start_bonafide_flow' is clicked start conversation
-            CallbackQueryHandler(start_bonafide_flow, pattern="^start_bonafide_flow$"),
+            CallbackQueryHandler(start_bonafide_flow, pattern=CB_START_BONAFIDE),
         ],
         states={
-            GET_PRN: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_prn)],
-            GET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_name)],
-            GET_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_phone)],
+            GET_PRN: [MessageHandler(TEXT_NOT_COMMAND, get_prn)],
+            GET_NAME: [MessageHandler(TEXT_NOT_COMMAND, get_name)],
+            GET_PHONE: [MessageHandler(TEXT_NOT_COMMAND, get_phone)],
+            GET_ALL: [MessageHandler(TEXT_NOT_COMMAND, get_all)],
             CONFIRM: [
                 # confirmation handled by callbackquery (yes/no)
-                CallbackQueryHandler(confirm_submission, pattern="^confirm_yes$"),
-                CallbackQueryHandler(confirm_submission, pattern="^confirm_no$"),
+                CallbackQueryHandler(confirm_submission, pattern=CB_CONFIRM),
             ],
         },
         fallbacks=[
             CommandHandler("cancel", cancel),
-            CallbackQueryHandler(cancel, pattern="^cancel$"),
+            CallbackQueryHandler(cancel, pattern=CB_CANCEL),
         ],
         per_user=True,
-        per_chat=False,
+        per_chat=True,
         allow_reentry=False,
+        # end abandoned conversations before their user_data is swept
+        conversation_timeout=USER_DATA_MAX_AGE,
     )
 
     # Register handlers
+    application.add_handler(TypeHandler(Update, touch_user_data), group=-1)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     # general menu callback handler (for menu navigation and admin_office)
-    application.add_handler(CallbackQueryHandler(button_click_handler, pattern="^(first_year|second_year|third_year|new_admission|admin_office|main_menu|fee_receipt|admission_details|academic)$"))
+    application.add_handler(CallbackQueryHandler(button_click_handler, pattern=CB_MENU))
     # Add conversation handler (this includes its own CallbackQuery entrypoint for bonafide)
     application.add_handler(conv_handler)
 
+    application.job_queue.run_repeating(sweep_user_data, interval=USER_DATA_SWEEP_INTERVAL)
+
     # Run the bot
     logger.info("Starting bot...")
-    application.run_polling()
+    if args.webhook:
+        # Telegram pushes updates to us; TLS is terminated by the reverse proxy
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=int(os.environ["PORT"]),
+            url_path=TOKEN,
+            webhook_url=f"{PUBLIC_URL.rstrip('/')}/{TOKEN}",
+            secret_token=os.environ["TG_SECRET"],
+        )
+    else:
+        # long polling, handy for local development
+        application.run_polling()
 
 
 if __name__ == "__main__":
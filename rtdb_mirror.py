@@ -0,0 +1,38 @@
+"""Mirror a Realtime Database node into a dict from firebase_admin listener events."""
+from typing import Dict, List
+
+
+def _set_path(node: Dict, parts: List[str], value) -> None:
+    for key in parts[:-1]:
+        child = node.get(key)
+        if not isinstance(child, dict):
+            child = node[key] = {}
+        node = child
+    if value is None:
+        node.pop(parts[-1], None)
+    else:
+        node[parts[-1]] = value
+
+
+def apply_delta(mirror: Dict, event) -> bool:
+    """Apply a firebase_admin listener event (put/patch) to `mirror`.
+
+    Returns True when the event carried a full snapshot of the listened node.
+    Listener callbacks run on firebase_admin's background thread; the mirror is
+    updated in place so readers on other threads never see it empty.
+    """
+    parts = [p for p in event.path.split("/") if p]
+    if event.event_type == "put":
+        if parts:
+            _set_path(mirror, parts, event.data)
+            return False
+        data = event.data or {}
+        stale = mirror.keys() - data.keys()
+        mirror.update(data)
+        for key in stale:
+            mirror.pop(key, None)
+        return True
+    if event.event_type == "patch":
+        for key, value in (event.data or {}).items():
+            _set_path(mirror, parts + [p for p in key.split("/") if p], value)
+    return False
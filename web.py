@@ -1,7 +1,17 @@
+import argparse
+import atexit
+import bisect
+import glob
+import hashlib
 import os
 import io
 import logging
-from datetime import datetime
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
 from flask import (
@@ -11,8 +21,10 @@ from flask import (
     redirect,
     url_for,
     flash,
+    jsonify,
     send_file,
 )
+from flask_caching import Cache
 from flask_login import (
     LoginManager,
     UserMixin,
@@ -30,28 +42,65 @@ from firebase_admin import credentials, db
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
 from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from waitress import serve
+
+from rtdb_mirror import apply_delta
 
 # ---------------- CONFIG (EDIT THESE) ----------------
 SERVICE_ACCOUNT_PATH = r"Service account path"
 DATABASE_URL = "Database URL"
-TEMPLATE_IMAGE_PATH = os.path.join(os.getcwd(), "bonafide_template.png")
+TEMPLATE_IMAGE_PATH = os.path.join(os.getcwd(), "static", "bonafide_template.png")
 ADMIN_USERNAME = "Admin Username"
 ADMIN_PASSWORD = "Admin Password"
 FLASK_PORT = 5000
+WEB_THREADS = 8  # waitress worker threads; PDF renders and Firebase reads no longer queue behind each other
+PDF_DIR = os.path.join(os.getcwd(), "pdfs")  # pre-rendered certificates
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_CACHE_TTL = 10  # seconds; rapid refreshes share one Firebase read
+SEARCH_LIMIT = 50
+SEARCH_FIELDS = ("prn", "name", "phone", "batch", "status")  # matched by the in-memory search
+_VALID_STATUS = frozenset({"Pending", "Approved", "Rejected"})
 # ----------------------------------------------------
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def setup_logging():
+    """
+    Route all logging through a queue. QueueHandler.prepare() still formats
+    the message in the calling (request) thread; what moves to the listener
+    thread is the stream write and the StreamHandler lock around it.
+    """
+    log_queue = queue.Queue(-1)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = QueueListener(log_queue, stream)
+    listener.start()
+    atexit.register(listener.stop)  # flush whatever is still queued on shutdown
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET", "change_this_secret_for_prod")
+# Already Flask's behaviour with debug off; pinned so turning debug on for a
+# session doesn't bring back a template stat on every render.
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+# Fallback browser caching for /static when nginx isn't in front (see README)
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 86400
 
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
+# In-process cache for Firebase reads (per worker)
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": DASHBOARD_CACHE_TTL})
+
 # Firebase refs (populated in init_firebase)
 applications_ref = None
 student_ref = None
@@ -93,6 +142,37 @@ def init_firebase():
     student_ref = db.reference("Students")
 
 
+# Listener-backed copy of bonafide_applications, so view/process/print don't
+# each round-trip to Firebase for the same record
+_apps_cache = {}
+_apps_cache_ready = threading.Event()  # set once the first full snapshot arrives
+_apps_listener = None
+
+
+def _on_apps_event(event):
+    if apply_delta(_apps_cache, event):
+        _apps_cache_ready.set()
+
+
+def start_apps_listener():
+    global _apps_listener
+    try:
+        # callbacks run on firebase_admin's background thread
+        _apps_listener = applications_ref.listen(_on_apps_event)
+    except Exception as e:
+        logger.exception("Could not listen to bonafide_applications, reading per request: %s", e)
+
+
+def get_application(app_id):
+    """Return one application, from the listener cache when it has the record."""
+    if _apps_cache_ready.is_set():
+        app_data = _apps_cache.get(app_id)
+        if app_data is not None:
+            return app_data
+    # cache not primed yet, or the bot's write hasn't reached the listener
+    return applications_ref.child(app_id).get()
+
+
 # ----------------------- Routes -----------------------
 @app.route("/", methods=["GET"])
 def index():
@@ -124,16 +204,122 @@ def logout():
     return redirect(url_for("login"))
 
 
+def load_dashboard_page(before: Optional[str]):
+    """
+    One page of applications, newest first, plus the key of the oldest row if
+    an older page exists. Served from the listener mirror once it has loaded;
+    until then (or if the listener failed) from Firebase, memoized briefly.
+    """
+    if _apps_cache_ready.is_set():
+        return _mirror_dashboard_page(before)
+    return _query_dashboard_page(before)
+
+
+def _mirror_dashboard_page(before: Optional[str]):
+    keys = sorted(list(_apps_cache))  # push keys sort chronologically
+    end = bisect.bisect_left(keys, before) if before else len(keys)
+    start = max(0, end - DASHBOARD_PAGE_SIZE)
+    older = keys[start] if start > 0 else None
+    page = {}
+    for app_id in reversed(keys[start:end]):
+        app_data = _apps_cache.get(app_id)  # may have been removed since the sort
+        if app_data is not None:
+            page[app_id] = app_data
+    return page, older
+
+
+@cache.memoize(timeout=DASHBOARD_CACHE_TTL)
+def _query_dashboard_page(before: Optional[str]):
+    """
+    Push keys sort chronologically, so ?before=<app_id> pages backwards with a
+    key-ordered query (no index needed) and only DASHBOARD_PAGE_SIZE records
+    are downloaded.
+    """
+    query = applications_ref.order_by_key()
+    if before:
+        query = query.end_at(before)
+    # one extra row tells us whether an older page exists; end_at is inclusive
+    rows = query.limit_to_last(DASHBOARD_PAGE_SIZE + (2 if before else 1)).get() or {}
+    rows.pop(before, None)
+    items = list(rows.items())
+    older = None
+    if len(items) > DASHBOARD_PAGE_SIZE:
+        items = items[-DASHBOARD_PAGE_SIZE:]
+        older = items[0][0]
+    return dict(reversed(items)), older
+
+
 @app.route("/dashboard")
 @login_required
 def dashboard():
+    # only the data is cached, not the page, so flash messages stay per request
+    before = request.args.get("before")
     try:
-        all_apps = applications_ref.get() or {}
+        page, older = load_dashboard_page(before)
     except Exception as e:
         logger.exception("Error reading applications: %s", e)
-        all_apps = {}
+        page, older = {}, None
         flash("Could not load applications from database.", "warning")
-    return render_template("dashboard.html", applications=all_apps)
+    return render_template("dashboard.html", applications=page, older=older, before=before)
+
+def search_applications(q: str):
+    """
+    Up to SEARCH_LIMIT matching applications, newest first. With the listener
+    mirror loaded this is a case-insensitive substring match over
+    SEARCH_FIELDS, like the old client-side filter but across every record;
+    before that it falls back to the indexed Firebase query below.
+    """
+    if _apps_cache_ready.is_set():
+        return _mirror_search(q)
+    return _query_search(q)
+
+
+def _mirror_search(q: str):
+    needle = q.casefold()
+    hits = []
+    for app_id, app_data in sorted(list(_apps_cache.items()), reverse=True):
+        if isinstance(app_data, dict) and any(
+                needle in str(app_data.get(field, "")).casefold() for field in SEARCH_FIELDS):
+            hits.append(dict(app_data, id=app_id))
+            if len(hits) >= SEARCH_LIMIT:
+                break
+    return hits
+
+
+@cache.memoize(timeout=DASHBOARD_CACHE_TTL)
+def _query_search(q: str):
+    """
+    Indexed Firebase search: digits are a PRN prefix, a status word matches
+    status exactly, anything else is a prefix of name_upper (the upper-cased
+    name the bot stores next to name). Phone and batch are not searchable.
+    Needs ".indexOn": ["prn", "name_upper", "status"] on bonafide_applications
+    in the RTDB rules (see README); without it Firebase rejects the query with
+    400 "Index not defined".
+    """
+    if q.isdigit():
+        query = applications_ref.order_by_child("prn").start_at(q).end_at(q + "\uf8ff")
+    elif q.capitalize() in _VALID_STATUS:
+        query = applications_ref.order_by_child("status").equal_to(q.capitalize())
+    else:
+        name = q.upper()
+        query = applications_ref.order_by_child("name_upper").start_at(name).end_at(name + "\uf8ff")
+    rows = query.limit_to_first(SEARCH_LIMIT).get() or {}
+    return [dict(app_data, id=app_id) for app_id, app_data in rows.items()]
+
+
+@app.route("/api/search")
+@login_required
+def api_search():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify(results=[])
+    try:
+        results = search_applications(q)
+    except Exception as e:
+        logger.exception("Search for %r failed: %s", q, e)
+        return jsonify(error="Search failed."), 502
+    return jsonify(results=results)
+
 
 @app.route("/application/<app_id>/process", methods=["POST"])
 @login_required
@@ -144,22 +330,44 @@ def process_application(app_id: str):
     """
     # Validate input
     new_status = request.form.get("status", "").strip()
-    if new_status not in ("Pending", "Approved", "Rejected"):
+    if new_status not in _VALID_STATUS:
         flash("Invalid status.", "error")
-        return redirect(url_for("view_application", app_id=app_id))
-
+        return redirect(url_for("view_application", app_id=app_id), code=303)
+
+    previous = _apps_cache.get(app_id)
+    if previous is not None and previous.get("status") == new_status:
+        # resubmitted form (e.g. back + refresh): no write, no second PDF render
+        flash(f"Application {app_id} is already {new_status}.", "info")
+        return redirect(url_for("view_application", app_id=app_id), code=303)
+
+    processed_at = datetime.utcnow().isoformat()
+    # optimistic update: the redirect below reads the new status from the cache
+    if previous is not None:
+        _apps_cache[app_id] = dict(previous, status=new_status, processed_at=processed_at)
     try:
-        # Update DB
-        applications_ref.child(app_id).update({
-            "status": new_status,
-            "processed_at": datetime.utcnow().isoformat()
+        # Update DB: one atomic multi-location update (one round-trip); any
+        # denormalized copy of the status belongs in this same dict
+        db.reference("/").update({
+            f"bonafide_applications/{app_id}/status": new_status,
+            f"bonafide_applications/{app_id}/processed_at": processed_at,
         })
+        # admins should see their own edit on the next dashboard load
+        cache.delete_memoized(_query_dashboard_page)
+        cache.delete_memoized(_query_search)
+        # render the certificate now, off the request thread, so printing is a file send
+        if new_status == "Approved":
+            pdf_executor.submit(render_and_store_pdf, app_id)
+        else:
+            discard_stored_pdf(app_id)
         flash(f"Application {app_id} status updated to {new_status}.", "success")
     except Exception as e:
+        if previous is not None:
+            _apps_cache[app_id] = previous
         logger.exception("Failed to update application %s: %s", app_id, e)
         flash("Failed to update application in database.", "danger")
 
-    return redirect(url_for("view_application", app_id=app_id))
+    # 303 so a browser refresh re-GETs the page instead of re-POSTing the form
+    return redirect(url_for("view_application", app_id=app_id), code=303)
 
 
 
@@ -167,7 +375,7 @@ def process_application(app_id: str):
 @login_required
 def view_application(app_id: str):
     try:
-        app_data = applications_ref.child(app_id).get()
+        app_data = get_application(app_id)
     except Exception as e:
         logger.exception("Error reading application %s: %s", app_id, e)
         app_data = None
@@ -178,113 +386,268 @@ def view_application(app_id: str):
 
 
 # ------------------ PDF generation -------------------
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from datetime import datetime
+# Single-page PDF version of the PNG template (see build_template_pdf)
+TEMPLATE_PDF_PATH = os.path.splitext(TEMPLATE_IMAGE_PATH)[0] + ".pdf"
+
+_TEMPLATE_PDF = None  # bytes of TEMPLATE_PDF_PATH
+_BONAFIDE_SIZE = None  # (width, height) in points, one point per template pixel
+_TEMPLATE_DIGEST = None  # sha1 of _TEMPLATE_PDF; part of every stored certificate's name
+_pdf_assets_lock = threading.Lock()
+
 
-def generate_bonafide_pdf(application_data):
+def build_template_pdf():
     """
-    Generates bonafide certificate PDF using PNG template
-    with perfectly aligned text.
+    One-time build step: convert the PNG template into a one-page PDF next to it.
+    Skipped while the PDF is newer than the PNG; this is the only place the PNG is decoded.
     """
+    if (os.path.exists(TEMPLATE_PDF_PATH)
+            and os.path.getmtime(TEMPLATE_PDF_PATH) >= os.path.getmtime(TEMPLATE_IMAGE_PATH)):
+        return
+    buffer = io.BytesIO()
+    with Image.open(TEMPLATE_IMAGE_PATH) as img:
+        img.load()
+        width, height = img.size
+        pdf = canvas.Canvas(buffer, pagesize=(width, height))
+        pdf.drawImage(ImageReader(img), 0, 0, width=width, height=height)
+        pdf.showPage()
+        pdf.save()
+    # write-then-rename so concurrent workers never read a half-written file
+    tmp_path = f"{TEMPLATE_PDF_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(buffer.getvalue())
+    os.replace(tmp_path, TEMPLATE_PDF_PATH)
+    logger.info("Built %s from %s", TEMPLATE_PDF_PATH, TEMPLATE_IMAGE_PATH)
+
+
+def init_pdf_assets():
+    """Load the template PDF once; read-only (and thread-safe) afterwards."""
+    global _TEMPLATE_PDF, _BONAFIDE_SIZE, _TEMPLATE_DIGEST
+    with _pdf_assets_lock:
+        if _TEMPLATE_PDF is None:
+            # resolve the standard font once instead of on the first request
+            pdfmetrics.getFont("Times-Roman")
+            build_template_pdf()
+            with open(TEMPLATE_PDF_PATH, "rb") as fh:
+                template = fh.read()
+            box = PdfReader(io.BytesIO(template)).pages[0].mediabox
+            _BONAFIDE_SIZE = (float(box.width), float(box.height))
+            _TEMPLATE_DIGEST = hashlib.sha1(template).hexdigest()
+            _TEMPLATE_PDF = template
+            logger.info("Loaded bonafide template %s (%gx%g)", TEMPLATE_PDF_PATH, *_BONAFIDE_SIZE)
+    return _TEMPLATE_PDF, _BONAFIDE_SIZE
+
+
+def get_template():
+    if _TEMPLATE_PDF is None:
+        return init_pdf_assets()
+    return _TEMPLATE_PDF, _BONAFIDE_SIZE
+
+
+# pagesize -> template page scaled to that size (bytes), made once per size
+_BACKGROUND_PDFS = {}
+
+
+def get_background_pdf(pagesize):
+    template, size = get_template()
+    if pagesize == size:
+        return template
+    pdf_bytes = _BACKGROUND_PDFS.get(pagesize)
+    if pdf_bytes is None:
+        page = PdfReader(io.BytesIO(template)).pages[0]
+        page.scale_to(*pagesize)
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pdf_bytes = _BACKGROUND_PDFS[pagesize] = buffer.getvalue()
+    return pdf_bytes
+
 
+def stamp_on_background(pagesize, overlay):
+    """Merge a text-only overlay PDF onto the template page.
+
+    The template is kept as bytes and parsed per call because merge_page
+    mutates the page; parsing does not decode the image stream.
+    """
+    page = PdfReader(io.BytesIO(get_background_pdf(pagesize))).pages[0]
+    page.merge_page(PdfReader(overlay).pages[0])
+    writer = PdfWriter()
+    writer.add_page(page)
     buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
 
-    # --- Load template image ---
-    template_path = "static/bonafide_template.png"
-    bg = ImageReader(template_path)
-    img_width, img_height = bg.getSize()
-
-    # --- Create canvas EXACTLY same size as image ---
-    pdf = canvas.Canvas(buffer, pagesize=(img_width, img_height))
-
-    # --- Draw background ---
-    pdf.drawImage(
-        template_path,
-        0,
-        0,
-        width=img_width,
-        height=img_height
-    )
+# Printed certificate date, reformatted only when the day changes
+_DATE_CACHE = {"day": None, "str": ""}
 
-    # ================= TEXT SETTINGS =================
-    pdf.setFillColorRGB(0, 0, 0)
 
-    # ---------- NAME (CENTERED) ----------
-    pdf.setFont("Times-Bold", 22)
-    pdf.drawCentredString(
-        img_width / 2,
-        img_height - 470,
-        application_data["name"]
-    )
+def today_str():
+    today = date.today()
+    if _DATE_CACHE["day"] != today:
+        # string first: a reader that sees the new day also sees its string
+        _DATE_CACHE["str"] = today.strftime("%d / %m / %Y")
+        _DATE_CACHE["day"] = today
+    return _DATE_CACHE["str"]
 
-    # ---------- YEAR & BRANCH ----------
-    pdf.setFont("Times-Roman", 14)
-    pdf.drawString(
-        500,
-        img_height - 545,
-        "First Year"
-    )
 
-    pdf.drawString(
-        650,
-        img_height - 545,
-        "Engineering"
-    )
+# Approved certificates are rendered once, in the background, into PDF_DIR
+pdf_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pdf")
+# Firebase push ids only contain these characters; also keeps paths inside PDF_DIR
+_APP_ID_RE = re.compile(r"[-_A-Za-z0-9]+")
+_PRN_RE = re.compile(r"[A-Za-z0-9]+")
 
-    # ---------- PRN ----------
-    pdf.drawString(
-        520,
-        img_height - 595,
-        application_data["prn"]
-    )
 
-    # ---------- BATCH ----------
-    pdf.drawString(
-        345,
-        img_height - 660,
-        application_data["batch"]
-    )
+def has_valid_prn(app_data):
+    """Reject malformed records before rendering; the PRN also ends up in the download name."""
+    prn = app_data.get("prn")
+    return isinstance(prn, str) and _PRN_RE.fullmatch(prn) is not None
 
-    # ---------- PURPOSE ----------
-    pdf.drawString(
-        480,
-        img_height - 720,
-        "Official Use"
-    )
 
-    # ---------- DATE ----------
-    today = datetime.now().strftime("%d / %m / %Y")
-    pdf.drawString(
-        320,
-        img_height - 770,
-        today
-    )
+def stored_pdf_path(app_id, app_data, today):
+    """
+    File for one exact certificate: the name hashes the printed fields, the
+    template and the date, so any change to those is a miss and re-renders.
+    """
+    get_template()  # sets _TEMPLATE_DIGEST
+    key = repr((_TEMPLATE_DIGEST, today, certificate_fields(app_data)))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(PDF_DIR, f"{app_id}.{digest}.pdf")
 
-    # ---------- PLACE ----------
-    pdf.drawString(
-        150,
-        img_height - 840,
-        "Pune"
-    )
 
-    # =================================================
+# Serialise one app's final status check + rename against discard_stored_pdf.
+# Striped per app id, so the Firebase read a cache miss makes under the lock
+# only holds up work on the same (or a colliding) application.
+_PDF_STORE_LOCKS = tuple(threading.Lock() for _ in range(64))
+
+
+def _pdf_store_lock(app_id):
+    return _PDF_STORE_LOCKS[hash(app_id) % len(_PDF_STORE_LOCKS)]
+
+
+def _remove_stored_pdfs(app_id, keep=None):
+    # Firebase keys never contain ".", so this only matches this app's files
+    for old in glob.glob(os.path.join(PDF_DIR, f"{glob.escape(app_id)}.*.pdf")):
+        if old != keep:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+# (field, default) in the order render_print_pdf unpacks them
+PRINT_FIELDS = (
+    ("name", ""),
+    ("prn", ""),
+    ("batch", ""),
+    ("branch", "Engineering"),
+    ("year", "First Year"),
+    ("purpose", "Bonafide Certificate"),
+)
+
+
+def certificate_fields(app_data):
+    """
+    PRINT_FIELDS values as strings, in order, or None if any is not a scalar.
+    Numbers are printed as-is (Students often stores batch as an int and the
+    bot copies it verbatim); lists, dicts and booleans mean a malformed record.
+    """
+    values = []
+    for key, default in PRINT_FIELDS:
+        value = app_data.get(key, default)
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            return None
+        values.append(str(value))
+    return tuple(values)
+
+
+def render_print_pdf(app_data, today):
+    """A4 bonafide certificate for an application record, dated `today`."""
+    # ---- Text overlay (background is stamped from the cached page) ----
+    overlay = io.BytesIO()
+    # no zlib: pypdf inflates the overlay again in merge_page and writes the merged stream uncompressed
+    pdf = canvas.Canvas(overlay, pagesize=A4, pageCompression=0)
+
+    # ---- SAFE DATA FETCH ----
+    fields = certificate_fields(app_data)
+    if fields is None:
+        raise ValueError("application record has non-scalar certificate fields")
+    name, prn, batch, branch, year, purpose = fields
+
+    # ---- TEXT (one text object: a single BT/ET block instead of one per field) ----
+    text = pdf.beginText()
+    text.setFont("Times-Roman", 14)
+    for x, y, value in (
+        (180, 515, name),
+        (230, 485, year),
+        (310, 485, branch),
+        (260, 455, prn),
+        (360, 455, batch),
+        (120, 420, purpose),
+    ):
+        text.setTextOrigin(x, y)
+        text.textOut(value)
+
+    text.setFont("Times-Roman", 12)
+    text.setTextOrigin(120, 390)
+    text.textOut(today)
+    pdf.drawText(text)
 
     pdf.showPage()
     pdf.save()
-    buffer.seek(0)
+    overlay.seek(0)
+    return stamp_on_background(A4, overlay)
 
-    return buffer
+
+def render_and_store_pdf(app_id, app_data=None):
+    """
+    Make sure today's certificate for an approved application is in PDF_DIR and
+    return its path (None if not approved or rendering failed). Runs on
+    pdf_executor after approval, and inline from print_bonafide on a miss.
+    """
+    try:
+        if app_data is None:
+            app_data = get_application(app_id)
+        if not app_data or app_data.get("status") != "Approved":
+            return None
+        if not has_valid_prn(app_data) or certificate_fields(app_data) is None:
+            return None
+        today = today_str()
+        path = stored_pdf_path(app_id, app_data, today)
+        if os.path.exists(path):
+            return path
+        buffer = render_print_pdf(app_data, today)
+        os.makedirs(PDF_DIR, exist_ok=True)
+        # write-then-rename so a concurrent download never sees a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(buffer.getvalue())
+        with _pdf_store_lock(app_id):
+            # a reject may have landed while this job was queued or rendering
+            current = get_application(app_id)
+            if not current or current.get("status") != "Approved":
+                os.remove(tmp_path)
+                return None
+            os.replace(tmp_path, path)
+            _remove_stored_pdfs(app_id, keep=path)  # older fields, template or date
+        return path
+    except Exception as e:
+        logger.exception("Failed to render bonafide PDF for %s: %s", app_id, e)
+        return None
 
 
+def discard_stored_pdf(app_id):
+    with _pdf_store_lock(app_id):
+        _remove_stored_pdfs(app_id)
 
 
 @app.route("/application/<app_id>/print")
 @login_required
 def print_bonafide(app_id):
+    if not _APP_ID_RE.fullmatch(app_id):
+        return "Application not found", 404
     try:
-        app_data = applications_ref.child(app_id).get()
+        app_data = get_application(app_id)
 
         if not app_data:
             return "Application not found", 404
@@ -292,68 +655,59 @@ def print_bonafide(app_id):
         if app_data.get("status") != "Approved":
             return "Application not approved", 403
 
-        import io
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.utils import ImageReader
-        from datetime import datetime
+        if not has_valid_prn(app_data):
+            return "Application has an invalid PRN", 400
 
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        # ---- Background Image ----
-        bg_path = "static/bonafide_template.png"
-        pdf.drawImage(
-            ImageReader(bg_path),
-            0, 0,
-            width=width,
-            height=height
-        )
+        if certificate_fields(app_data) is None:
+            return "Application record is malformed", 400
 
-        # ---- SAFE DATA FETCH ----
-        name = app_data.get("name", "")
-        prn = app_data.get("prn", "")
-        batch = app_data.get("batch", "")
-        branch = app_data.get("branch", "Engineering")
-        year = app_data.get("year", "First Year")
-        purpose = app_data.get("purpose", "Bonafide Certificate")
-
-        # ---- TEXT ----
-        pdf.setFont("Times-Roman", 14)
-        pdf.drawString(180, 515, name)
-        pdf.drawString(230, 485, year)
-        pdf.drawString(310, 485, branch)
-        pdf.drawString(260, 455, prn)
-        pdf.drawString(360, 455, batch)
-        pdf.drawString(120, 420, purpose)
-
-        pdf.setFont("Times-Roman", 12)
-        pdf.drawString(
-            120, 390,
-            datetime.now().strftime("%d / %m / %Y")
-        )
-
-        pdf.showPage()
-        pdf.save()
-        buffer.seek(0)
+        # usually already on disk from the approval; renders here on a new day,
+        # after an edit, or while the background job is still running
+        path = render_and_store_pdf(app_id, app_data)
+        if path is None:
+            return "PDF generation failed. Check server logs.", 500
 
+        # conditional=True: Werkzeug derives ETag/Last-Modified from the file and answers 304s
         return send_file(
-            buffer,
+            path,
             as_attachment=True,
-            download_name=f"{prn}_bonafide.pdf",
-            mimetype="application/pdf"
+            download_name=f"{app_data['prn']}_bonafide.pdf",
+            mimetype="application/pdf",
+            conditional=True,
+            max_age=0,  # always revalidate: a certificate changes if the application is re-processed
         )
 
     except Exception as e:
-        print("🔥 PDF ERROR:", e)
+        logger.exception("Failed to serve bonafide PDF for %s: %s", app_id, e)
         return "PDF generation failed. Check server logs.", 500
 
 
+# application.html files written by older versions link to "generate_bonafide",
+# which never existed; ensure_templates() doesn't overwrite them, so keep the
+# name resolvable instead of failing every view page render.
+app.add_url_rule("/application/<app_id>/print", endpoint="generate_bonafide", view_func=print_bonafide)
+
+
 
 # ---------------------- start app -----------------------
+# sha256 of default templates written by earlier versions of ensure_templates().
+# A file that still matches one was never customised, so it is upgraded in place.
+_PREVIOUS_TEMPLATE_DEFAULTS = {
+    "dashboard.html": {
+        "66a4745ca99322f1cd6f1fb7d89bd15b862d829d69a3f98acd8dd8e97e78376f",  # unpaginated, client-side filter
+        "445a1b10c72c85ad9d4b12438f170a446e7d6137898af3715621d08ee8ced155",  # paginated, client-side filter
+    },
+    "application.html": {
+        "08b02b386c3de3c64b5a042c4c2a763e13572ac9aa41076681ce5f3e621736e4",  # links to generate_bonafide
+    },
+}
+
+
 def ensure_templates():
-    """Create default Bootstrap templates if missing (only if you didn't already create them)."""
+    """
+    Create default Bootstrap templates if missing, and upgrade files that are an
+    unmodified earlier default. Customised templates are never touched.
+    """
     TPLS = {
         "login.html": """<!doctype html>
 <html lang="en"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/>
@@ -381,8 +735,12 @@ def ensure_templates():
 <div class="alert alert-{{ category }} alert-dismissible fade show" role="alert">{{ msg }} <button type="button" class="btn-close" data-bs-dismiss="alert"></button></div>{% endfor %}{% endif %}{% endwith %}
 <div class="table-responsive"><table class="table table-striped table-hover align-middle"><thead class="table-light position-sticky top-0"><tr><th>Firebase ID</th><th>PRN</th><th>Name</th><th>Phone</th><th>Batch</th><th>Status</th><th>Submitted</th><th>Actions</th></tr></thead>
 <tbody id="appTableBody">{% if applications %}{% for app_id, app in applications.items() %}<tr><td class="text-monospace">{{ app_id }}</td><td>{{ app.get('prn','') }}</td><td>{{ app.get('name','') }}</td><td>{{ app.get('phone','') }}</td><td>{{ app.get('batch','') }}</td><td>{% if app.get('status') == 'Approved' %}<span class="badge bg-success">Approved</span>{% elif app.get('status') == 'Rejected' %}<span class="badge bg-danger">Rejected</span>{% else %}<span class="badge bg-secondary">Pending</span>{% endif %}</td><td>{{ app.get('submitted_at','') }}</td>
-<td><a class="btn btn-sm btn-outline-primary" href="{{ url_for('view_application', app_id=app_id) }}">View</a></td></tr>{% endfor %}{% else %}<tr><td colspan="8" class="text-center">No applications found.</td></tr>{% endif %}</tbody></table></div></div>
-<script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script><script>const searchBox=document.getElementById('searchBox');const tbody=document.getElementById('appTableBody');searchBox.addEventListener('input',function(){const q=this.value.trim().toLowerCase();if(!q){Array.from(tbody.rows).forEach(r=>r.style.display='');return;}Array.from(tbody.rows).forEach(function(row){const text=row.innerText.toLowerCase();row.style.display=text.includes(q)?'':'none';});});</script></body></html>""",
+<td><a class="btn btn-sm btn-outline-primary" href="{{ url_for('view_application', app_id=app_id) }}">View</a></td></tr>{% endfor %}{% else %}<tr><td colspan="8" class="text-center">No applications found.</td></tr>{% endif %}</tbody></table></div>
+<div class="d-flex justify-content-between mt-2"><div>{% if before %}<a class="btn btn-sm btn-outline-secondary" href="{{ url_for('dashboard') }}">&laquo; Newest</a>{% endif %}</div><div>{% if older %}<a class="btn btn-sm btn-outline-secondary" href="{{ url_for('dashboard', before=older) }}">Older &raquo;</a>{% endif %}</div></div></div>
+<script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script><script>const searchBox=document.getElementById('searchBox');const tbody=document.getElementById('appTableBody');const pageRows=tbody.innerHTML;const searchUrl="{{ url_for('api_search') }}";const viewUrl="{{ url_for('view_application', app_id='__ID__') }}";let timer=null;
+function cell(tr,text,cls){const td=document.createElement('td');if(cls)td.className=cls;td.textContent=text==null?'':text;tr.appendChild(td);return td;}
+function render(rows){tbody.innerHTML='';if(!rows.length){cell(tbody.insertRow(),'No applications found.','text-center').colSpan=8;return;}rows.forEach(function(a){const tr=tbody.insertRow();cell(tr,a.id,'text-monospace');cell(tr,a.prn);cell(tr,a.name);cell(tr,a.phone);cell(tr,a.batch);const s=(a.status==='Approved'||a.status==='Rejected')?a.status:'Pending';const badge=document.createElement('span');badge.className='badge '+({Approved:'bg-success',Rejected:'bg-danger'}[s]||'bg-secondary');badge.textContent=s;cell(tr,'').appendChild(badge);cell(tr,a.submitted_at);const link=document.createElement('a');link.className='btn btn-sm btn-outline-primary';link.href=viewUrl.replace('__ID__',encodeURIComponent(a.id));link.textContent='View';cell(tr,'').appendChild(link);});}
+searchBox.addEventListener('input',function(){clearTimeout(timer);const q=this.value.trim();timer=setTimeout(function(){if(!q){tbody.innerHTML=pageRows;return;}fetch(searchUrl+'?q='+encodeURIComponent(q)).then(r=>r.json()).then(function(data){if(searchBox.value.trim()===q)render(data.results||[]);});},200);});</script></body></html>""",
         "application.html": """<!doctype html><html lang="en"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/><title>Application {{ app_id }}</title>
 <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet"></head><body>
 <nav class="navbar navbar-expand-lg navbar-dark bg-primary"><div class="container-fluid"><a class="navbar-brand" href="{{ url_for('dashboard') }}">DTIL Admin</a><div class="collapse navbar-collapse"><ul class="navbar-nav ms-auto"><li class="nav-item"><a class="nav-link" href="{{ url_for('logout') }}">Logout</a></li></ul></div></div></nav>
@@ -392,24 +750,48 @@ def ensure_templates():
 <dt class="col-sm-3">Purpose</dt><dd class="col-sm-9">{{ app.get('purpose') }}</dd><dt class="col-sm-3">Submitted at</dt><dd class="col-sm-9">{{ app.get('submitted_at') }}</dd><dt class="col-sm-3">Status</dt><dd class="col-sm-9">{{ app.get('status') }}</dd></dl>
 <form method="post" action="{{ url_for('process_application', app_id=app_id) }}" class="row g-2 mb-3"><div class="col-auto"><select name="status" class="form-select"><option value="Pending" {% if app.get('status')=='Pending' %}selected{% endif %}>Pending</option><option value="Approved" {% if app.get('status')=='Approved' %}selected{% endif %}>Approve</option><option value="Rejected" {% if app.get('status')=='Rejected' %}selected{% endif %}>Reject</option></select></div>
 <div class="col-auto"><button class="btn btn-primary">Update Status</button></div><div class="col-auto"><a class="btn btn-outline-secondary" href="{{ url_for('dashboard') }}">Back</a></div></form>
-<a class="btn btn-success" href="{{ url_for('generate_bonafide', app_id=app_id) }}">Generate & Download Bonafide PDF</a>
+<a class="btn btn-success" href="{{ url_for('print_bonafide', app_id=app_id) }}">Generate & Download Bonafide PDF</a>
 </div></div></div><script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script></body></html>"""
     }
-    tpl_dir = os.path.join(os.getcwd(), "templates")
+    # where Flask's loader looks, whatever the working directory is
+    tpl_dir = os.path.join(app.root_path, app.template_folder)
     os.makedirs(tpl_dir, exist_ok=True)
     for name, content in TPLS.items():
         path = os.path.join(tpl_dir, name)
-        if not os.path.exists(path):
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(content)
-            logger.info("Wrote default template: %s", path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                digest = hashlib.sha256(f.read().encode("utf-8")).hexdigest()
+            if digest not in _PREVIOUS_TEMPLATE_DEFAULTS.get(name, ()):
+                continue  # current default or customised
+            logger.info("Upgrading unmodified default template: %s", path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        logger.info("Wrote default template: %s", path)
+    # Compile up front so the first request doesn't pay for parsing.
+    for name in TPLS:
+        app.jinja_env.get_template(name)
 
 
 def start_app():
+    parser = argparse.ArgumentParser(description="PCCOER helpdesk admin panel")
+    parser.add_argument(
+        "--dev",
+        action="store_true",
+        help="use the single-threaded Flask development server instead of waitress",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
     ensure_templates()
     init_firebase()
-    logger.info("Starting Flask app on port %d", FLASK_PORT)
-    app.run(host="0.0.0.0", port=FLASK_PORT, debug=False)
+    start_apps_listener()
+    init_pdf_assets()
+    if args.dev:
+        logger.info("Starting Flask dev server on port %d", FLASK_PORT)
+        app.run(host="0.0.0.0", port=FLASK_PORT, debug=False)
+    else:
+        logger.info("Serving with waitress on port %d (%d threads)", FLASK_PORT, WEB_THREADS)
+        serve(app, host="0.0.0.0", port=FLASK_PORT, threads=WEB_THREADS)
 
 
 if __name__ == "__main__":